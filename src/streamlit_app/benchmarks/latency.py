@@ -0,0 +1,82 @@
+# © 2025 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+#
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement
+# available at http://aws.amazon.com/agreement or other written agreement between
+# Customer and either Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+
+"""
+Measures per-frame latency through a chain of 1, 3 and 5 VideoStreamProcessor stages.
+Frames are sent at a fixed rate below the pipeline capacity, so the latency is the
+hand-over time between stages rather than queueing behind other frames.
+
+Run from src/streamlit_app:
+    python -m benchmarks.latency --frames 200 --interval-ms 20
+"""
+
+import argparse
+import multiprocessing
+from statistics import mean, quantiles
+from time import perf_counter, sleep
+
+from numpy import zeros, uint8
+
+from benchmarks.utils import print_report
+from shared.logic import END_OF_STREAM, Frame, FrameProcessor, VideoStreamProcessor
+
+
+class PassThrough(FrameProcessor):
+    def process(self, frame: Frame) -> Frame:
+        return frame
+
+
+def run(ctx, stages: int, args) -> dict:
+    source = ctx.JoinableQueue()
+    pipeline = []
+    for _ in range(stages):
+        upstream = pipeline[-1].output if pipeline else source
+        pipeline.append(VideoStreamProcessor(ctx, upstream, PassThrough(), 1))
+    for stage in pipeline:
+        stage.start()
+
+    buffer = zeros((360, 640, 3), dtype=uint8)
+    # warm up the worker processes before measuring
+    source.put(Frame(buffer, 0, -1, 0))
+    pipeline[-1].output.get()
+
+    latencies = []
+    for index in range(args.frames):
+        sent = perf_counter()
+        source.put(Frame(buffer, sent, index, 0))
+        frame = pipeline[-1].output.get()
+        latencies.append((perf_counter() - frame.timestamp) * 1000)
+        sleep(args.interval_ms / 1000)
+
+    source.put(END_OF_STREAM)
+    for _ in pipeline[-1].frames():
+        pass
+    for stage in pipeline:
+        stage.stop()
+
+    percentiles = quantiles(latencies, n=100)
+    return {
+        "stages": stages,
+        "frames": args.frames,
+        "mean_ms": round(mean(latencies), 3),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print_report([run(ctx, stages, args) for stages in (1, 3, 5)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# © 2025 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+#
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement
+# available at http://aws.amazon.com/agreement or other written agreement between
+# Customer and either Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+
+"""
+Compares frames/sec and memory of the default queue transport with SharedMemoryTransport
+between a frame producer process and a VideoStreamProcessor.
+
+Run from src/streamlit_app:
+    python -m benchmarks.transport --frames 1000 --width 1920 --height 1080
+"""
+
+import argparse
+import multiprocessing
+from time import perf_counter
+
+from numpy import uint8
+from numpy.random import default_rng
+
+from benchmarks.utils import RssSampler, print_report
+from shared.logic import Frame, FrameProcessor, FrameTransport, VideoStreamProcessor
+from shared.transport import SharedMemoryTransport
+
+
+class FirstPixel(FrameProcessor):
+    """Forwards a one pixel frame, so only the cost of moving frames is measured"""
+
+    def process(self, frame: Frame) -> Frame:
+        return Frame(
+            frame.buffer[:1, :1].copy(), frame.timestamp, frame.index, frame.fps
+        )
+
+
+def produce(frame_queue, transport: FrameTransport, frames: int, shape: tuple):
+    buffer = default_rng(0).integers(0, 255, shape, dtype=uint8)
+    for index in range(frames):
+        item = None
+        while item is None:
+            item = transport.pack(Frame(buffer, perf_counter() * 1000, index, 30.0), 1.0)
+        frame_queue.put(item)
+
+
+def run(ctx, transport: FrameTransport, args) -> dict:
+    shape = (args.height, args.width, 3)
+    frame_queue = ctx.JoinableQueue(maxsize=args.queue_size)
+    processor = VideoStreamProcessor(
+        ctx, frame_queue, FirstPixel(), args.workers, transport=transport
+    )
+    producer = ctx.Process(
+        target=produce, args=(frame_queue, transport, args.frames, shape), daemon=True
+    )
+
+    with RssSampler() as memory:
+        processor.start()
+        start = perf_counter()
+        producer.start()
+        for _ in range(args.frames):
+            processor.output.get(timeout=30)
+        elapsed = perf_counter() - start
+        producer.join()
+        processor.stop()
+    transport.close()
+
+    return {
+        "transport": type(transport).__name__,
+        "frames": args.frames,
+        "fps": round(args.frames / elapsed, 1),
+        "peak_rss_mb": round(memory.peak_rss / 2**20, 1),
+        "peak_private_mb": round(memory.peak_anon / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--queue-size", type=int, default=250)
+    parser.add_argument("--slots", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    slot_bytes = args.width * args.height * 3
+    print_report(
+        [
+            run(ctx, FrameTransport(), args),
+            run(ctx, SharedMemoryTransport(ctx, args.slots, slot_bytes), args),
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# © 2025 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+#
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement
+# available at http://aws.amazon.com/agreement or other written agreement between
+# Customer and either Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+
+import json
+import multiprocessing
+import os
+import threading
+
+
+def process_memory(pid: int) -> dict[str, int]:
+    """Returns VmRSS and RssAnon of a process in bytes (Linux only)"""
+    memory = {"rss": 0, "anon": 0}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rss"] = int(line.split()[1]) * 1024
+                elif line.startswith("RssAnon:"):
+                    memory["anon"] = int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return memory
+
+
+class RssSampler:
+    """
+    Samples the memory of this process and all its live child processes in a background thread
+    and keeps the peak of the sums. `rss` counts shared memory pages in every process mapping them,
+    `anon` counts private memory only.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.peak_rss = 0
+        self.peak_anon = 0
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            pids = [os.getpid()] + [p.pid for p in multiprocessing.active_children()]
+            samples = [process_memory(pid) for pid in pids]
+            self.peak_rss = max(self.peak_rss, sum(m["rss"] for m in samples))
+            self.peak_anon = max(self.peak_anon, sum(m["anon"] for m in samples))
+            self._stop.wait(self._interval)
+
+
+def print_report(report):
+    print(json.dumps(report, indent=2))
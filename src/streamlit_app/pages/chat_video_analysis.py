@@ -7,7 +7,6 @@
 import multiprocessing
 from datetime import datetime
 from datetime import timedelta
-from time import sleep
 
 import streamlit as st
 
@@ -16,12 +15,14 @@ from domain import Config, CONFIG
 from response_handler import ResponseHandler
 from shared.logic import VideoStreamSource, FrameProcessorChain, VideoStreamProcessor
 from shared.processors import (
+    GrayscaleConversion,
     SimpleMotionDetection,
     FrameSampling,
     GridAggregator,
     S3Storage,
     LambdaProcessor,
 )
+from shared.transport import SharedMemoryTransport
 from utils import show_footer, clear_input, show_empty_container
 
 logger = Connections.logger
@@ -59,9 +60,13 @@ def video_stream_section():
 
         # Initialize processing components
         ctx = multiprocessing.get_context("spawn")
-        source = VideoStreamSource(ctx, config.stream_url, queue_size=250)
+        transport = SharedMemoryTransport(ctx, slots=32)
+        source = VideoStreamSource(
+            ctx, config.stream_url, queue_size=250, transport=transport
+        )
         chain = FrameProcessorChain(
             [
+                GrayscaleConversion(),
                 SimpleMotionDetection(motion_threshold=10_000, frame_skip_size=1),
                 FrameSampling(
                     timedelta(milliseconds=250), threshold_time=timedelta(seconds=2)
@@ -69,7 +74,10 @@ def video_stream_section():
                 GridAggregator(shape=(13, 3)),
             ]
         )
-        processor = VideoStreamProcessor(ctx, source.output, chain, 1)
+        # grayscale conversion runs in 3 parallel workers, the stateful rest of the chain in 1 ordered worker
+        processor = VideoStreamProcessor(
+            ctx, source.output, chain, 3, transport=transport
+        )
         storage_chain = FrameProcessorChain(
             [
                 S3Storage(
@@ -96,13 +104,15 @@ def video_stream_section():
                 processor.start()
                 source.start()
 
-                while source.running:
-                    sleep(0.1)
+                # Runs until the end of stream went through the whole pipeline
+                for frame in sink.frames():
+                    logger.debug(f"Processed grid #{int(frame.index)}")
 
                 # Cleanup when done
                 source.stop()
                 processor.stop()
                 sink.stop()
+                transport.close()
                 st.session_state.processing_complete = True
             except Exception as e:
                 st.session_state.processing_error = str(e)
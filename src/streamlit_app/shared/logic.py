@@ -7,8 +7,9 @@
 import multiprocessing as mp
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from heapq import heappush, heappop
 from multiprocessing import JoinableQueue
-from time import sleep
+from queue import Empty, Full
 from typing import Optional
 from datetime import datetime
 import cv2
@@ -17,6 +18,17 @@ from connections import Connections
 
 logger = Connections.logger
 
+# Blocking queue operations time out after this many seconds to check if the pipeline was stopped.
+# It bounds how fast workers notice stop(), frames are handed over as soon as they are available.
+POLL_TIMEOUT = 0.5
+
+
+class EndOfStream:
+    """Marker put on a queue after the last frame of the stream"""
+
+
+END_OF_STREAM = EndOfStream()
+
 
 @dataclass
 class Frame:
@@ -25,10 +37,15 @@ class Frame:
     index: float
     fps: float
     metadata: dict = field(default_factory=dict)
+    # capture order assigned by VideoStreamSource, -1 if unknown
+    sequence: int = -1
 
 
 # TODO: add automatic metrics like fps etc
 class FrameProcessor(ABC):
+    # Stateful processors keep state between frames, so they must see every frame in capture order.
+    # VideoStreamProcessor runs them in a single ordered worker, stateless ones may run in parallel.
+    stateful: bool = False
 
     @abstractmethod
     def process(self, frame: Frame) -> Optional[Frame]: ...
@@ -38,6 +55,10 @@ class FrameProcessorChain(FrameProcessor):
     def __init__(self, chain: list[FrameProcessor]):
         self._chain = chain
 
+    @property
+    def stateful(self) -> bool:
+        return any(processor.stateful for processor in self._chain)
+
     def process(self, frame: Frame) -> Optional[Frame]:
         current = frame
         for processor in self._chain:
@@ -45,16 +66,63 @@ class FrameProcessorChain(FrameProcessor):
                 current = processor.process(current)
         return current
 
+    def split(self) -> tuple["FrameProcessorChain", "FrameProcessorChain"]:
+        """
+        :return: the stateless processors before the first stateful one, and the remaining processors
+        """
+        stateless = 0
+        while stateless < len(self._chain) and not self._chain[stateless].stateful:
+            stateless += 1
+        return (
+            FrameProcessorChain(self._chain[:stateless]),
+            FrameProcessorChain(self._chain[stateless:]),
+        )
+
+    def __len__(self):
+        return len(self._chain)
+
+
+class FrameTransport:
+    """
+    Moves frames between pipeline processes. The default transport pickles frames through the queue
+    together with their pixels, see `shared.transport.SharedMemoryTransport` for a zero-copy alternative.
+
+    Producers call `pack` before putting a frame on a queue, consumers call `unpack` on every item they get,
+    `detach` on anything they forward and `release` once done with the item.
+    """
+
+    def pack(self, frame: Frame, timeout: Optional[float] = None):
+        return frame
+
+    def unpack(self, item) -> Frame:
+        return item
+
+    def detach(self, frame: Frame, item) -> Frame:
+        return frame
+
+    def repack(self, frame: Frame, item):
+        """Turns a frame unpacked from item back into a queue item, taking over what item holds"""
+        return frame
+
+    def release(self, item) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
 
 class VideoStreamSource:
 
-    def __init__(self, ctx, video_source, queue_size=32):
+    def __init__(
+        self, ctx, video_source, queue_size=32, transport: Optional[FrameTransport] = None
+    ):
         self._video_source = video_source
         self._output = ctx.JoinableQueue(maxsize=queue_size)
         self._running = ctx.Value("b", False)
+        self._transport = transport or FrameTransport()
         self._producer: ctx.Process = ctx.Process(
             target=self._capture_frames,
-            args=(self._video_source, self._output, self._running),
+            args=(self._video_source, self._output, self._running, self._transport),
             daemon=True,
         )
 
@@ -65,21 +133,15 @@ class VideoStreamSource:
         self._producer.start()
 
     def stop(self):
-        logger.info(f"** Motion end ** buffer size: {len(self._frame_buffer)}")
-        if not self._running.value:
-            return
+        """
+        Stops capturing. Frames already queued are left for the consumers, followed by END_OF_STREAM.
+        """
+        logger.info("Stopping video source")
         self._running.value = False
-        self._producer.join(timeout=1.0)
+        if self._producer.is_alive():
+            self._producer.join(timeout=2 * POLL_TIMEOUT)
         if self._producer.is_alive():
             self._producer.terminate()
-
-        while not self._output.empty():
-            try:
-                self._output.get_nowait()
-            except:
-                pass
-        self._output.close()
-        self._output.join_thread()
         logger.info("Video source stopped")
 
     @property
@@ -103,24 +165,37 @@ class VideoStreamSource:
         return success, Frame(frame, timestamp, index, fps)
 
     @staticmethod
-    def _capture_frames(video_source, frame_queue, running):
+    def _capture_frames(video_source, frame_queue, running, transport: FrameTransport):
         # https://docs.opencv.org/4.10.0/d8/dfe/classcv_1_1VideoCapture.html
         stream = cv2.VideoCapture(video_source)
+        sequence = 0
 
         while running.value:
-            if not frame_queue.full():
-                success, frame = VideoStreamSource.get_frame(stream)
-                if not success:
-                    running.value = False
-                    break
-                frame_queue.put(frame)
-            else:
-                sleep(0.1)
+            success, frame = VideoStreamSource.get_frame(stream)
+            if not success:
+                break
+            frame.sequence = sequence
+            sequence += 1
+            item = None
+            while item is None and running.value:
+                item = transport.pack(frame, timeout=POLL_TIMEOUT)
+            if item is not None and not put(frame_queue, item, running):
+                transport.release(item)
 
         stream.release()
+        running.value = False
+        frame_queue.put(END_OF_STREAM)
 
 
 class VideoStreamProcessor:
+    """
+    Runs a FrameProcessor on the frames of input_queue in num_workers processes.
+
+    Stateless processors run in all workers in parallel, so output order is not guaranteed.
+    When the processor is stateful and num_workers > 1, it must be a FrameProcessorChain starting with
+    stateless processors: these run in num_workers parallel workers, and the rest of the chain runs in one
+    extra ordered worker, which restores the input order with a reorder buffer before processing.
+    """
 
     def __init__(
         self,
@@ -128,21 +203,68 @@ class VideoStreamProcessor:
         input_queue: JoinableQueue,
         frame_processor: FrameProcessor,
         num_workers=None,
+        transport: Optional[FrameTransport] = None,
     ):
+        """
+        :param transport: transport of the frames in input_queue, the same instance the producer uses.
+        Output frames are always sent through the queue.
+        """
         self._ctx = ctx
         self._frame_processor = frame_processor
         self._input = input_queue
         self._output = ctx.JoinableQueue()
         self._running = ctx.Value("b", False)
         self._num_workers = num_workers or mp.cpu_count()
+        self._finished_workers = ctx.Value("i", 0)
+        self._transport = transport or FrameTransport()
+
+        parallel, ordered = frame_processor, None
+        if frame_processor.stateful and self._num_workers > 1:
+            if isinstance(frame_processor, FrameProcessorChain):
+                parallel, ordered = frame_processor.split()
+            else:
+                parallel, ordered = FrameProcessorChain([]), frame_processor
+            if not parallel:
+                logger.warning(
+                    f"{type(frame_processor).__name__} starts with a stateful processor, running it in 1 worker"
+                )
+                parallel, ordered, self._num_workers = frame_processor, None, 1
+
+        # with an ordered worker, parallel workers number the frames they take from the input queue
+        # and hand them over to the ordered worker through the reorder queue
+        self._tickets = ctx.Value("q", 0) if ordered else None
+        reorder_queue = ctx.Queue() if ordered else None
         self._processes = [
             self._ctx.Process(
                 target=self._process_frames,
-                args=(self._input, self._output, self._running, self._frame_processor),
+                args=(
+                    self._input,
+                    reorder_queue or self._output,
+                    self._running,
+                    parallel,
+                    self._transport,
+                    self._finished_workers,
+                    self._num_workers,
+                    self._tickets,
+                ),
                 daemon=True,
             )
             for _ in range(self._num_workers)
         ]
+        if ordered:
+            self._processes.append(
+                self._ctx.Process(
+                    target=self._process_ordered_frames,
+                    args=(
+                        reorder_queue,
+                        self._output,
+                        self._running,
+                        ordered,
+                        self._transport,
+                    ),
+                    daemon=True,
+                )
+            )
 
     def start(self):
         if self._running.value:
@@ -160,7 +282,7 @@ class VideoStreamProcessor:
         self._running.value = False
 
         for process in self._processes:
-            process.join(timeout=1.0)
+            process.join(timeout=2 * POLL_TIMEOUT)
             if process.is_alive():
                 process.terminate()
 
@@ -173,6 +295,24 @@ class VideoStreamProcessor:
         self._output.join_thread()
         logger.info("Video processor stopped")
 
+    def frames(self):
+        """
+        Yields output frames until END_OF_STREAM arrives, the processor is stopped or all its workers exited.
+        Use it to consume the output of the last processor of a pipeline.
+        """
+        while True:
+            try:
+                item = self._output.get(timeout=POLL_TIMEOUT)
+            except Empty:
+                if not self._running.value or not any(
+                    process.is_alive() for process in self._processes
+                ):
+                    return
+                continue
+            if isinstance(item, EndOfStream):
+                return
+            yield item
+
     @property
     def output(self):
         return self._output
@@ -183,17 +323,125 @@ class VideoStreamProcessor:
 
     @staticmethod
     def _process_frames(
-        frame_queue, result_queue, running, frame_processor: FrameProcessor
+        frame_queue,
+        result_queue,
+        running,
+        frame_processor: FrameProcessor,
+        transport: FrameTransport,
+        finished_workers,
+        num_workers: int,
+        tickets=None,
     ):
+        """
+        Without tickets, processed frames are put on result_queue.
+        With tickets, every input frame is numbered in queue order and (ticket, item or None) is put on
+        result_queue for the ordered worker, which takes over the transport item.
+        """
         while running.value:
+            if tickets is None:
+                ticket = None
+                try:
+                    item = frame_queue.get(timeout=POLL_TIMEOUT)
+                except Empty:
+                    continue
+            else:
+                with tickets.get_lock():
+                    try:
+                        item = frame_queue.get(timeout=POLL_TIMEOUT)
+                    except Empty:
+                        continue
+                    ticket = tickets.value
+                    if not isinstance(item, EndOfStream):
+                        tickets.value += 1
+
+            if isinstance(item, EndOfStream):
+                # hand the marker over to the sibling workers, the last one to finish forwards it
+                frame_queue.put(item)
+                with finished_workers.get_lock():
+                    finished_workers.value += 1
+                    last = finished_workers.value == num_workers
+                if last:
+                    result_queue.put(item)
+                # flush frames buffered by this process, so that none arrives after the marker
+                result_queue.close()
+                result_queue.join_thread()
+                return
+
+            forwarded = None
             try:
-                if not frame_queue.empty():
-                    frame = frame_queue.get()
-                    processed_frame = frame_processor.process(frame)
+                frame = transport.unpack(item)
+                processed_frame = frame_processor.process(frame)
+                if ticket is not None:
                     if processed_frame is not None:
-                        result_queue.put(processed_frame)
-                else:
-                    sleep(0.1)
+                        forwarded = transport.repack(processed_frame, item)
+                elif processed_frame is not None:
+                    result_queue.put(transport.detach(processed_frame, item))
             except Exception as e:
                 logger.error(f"Error in processing process: {e}")
                 raise e
+            finally:
+                if ticket is None:
+                    transport.release(item)
+                else:
+                    if forwarded is None:
+                        transport.release(item)
+                    # the ordered worker waits for every ticket, even for dropped frames
+                    result_queue.put((ticket, forwarded))
+
+    @staticmethod
+    def _process_ordered_frames(
+        reorder_queue,
+        result_queue,
+        running,
+        frame_processor: FrameProcessor,
+        transport: FrameTransport,
+    ):
+        # reorder buffer: min-heap of (ticket, item) handed over by the parallel workers
+        pending: list[tuple[int, object]] = []
+        next_ticket = 0
+
+        def process(item):
+            if item is None:
+                return
+            try:
+                frame = transport.unpack(item)
+                processed_frame = frame_processor.process(frame)
+                if processed_frame is not None:
+                    result_queue.put(transport.detach(processed_frame, item))
+            except Exception as e:
+                logger.error(f"Error in ordered processing process: {e}")
+                raise e
+            finally:
+                transport.release(item)
+
+        while running.value:
+            try:
+                entry = reorder_queue.get(timeout=POLL_TIMEOUT)
+            except Empty:
+                continue
+
+            if isinstance(entry, EndOfStream):
+                # all parallel workers flushed before the marker, left overs mean a worker failed
+                while pending:
+                    process(heappop(pending)[1])
+                result_queue.put(entry)
+                return
+
+            heappush(pending, entry)
+            while pending and pending[0][0] == next_ticket:
+                process(heappop(pending)[1])
+                next_ticket += 1
+
+
+def put(queue, item, running) -> bool:
+    """
+    Blocking put that gives up once running is cleared
+    :return: True if the item was queued
+    """
+    while running.value:
+        try:
+            queue.put(item, timeout=POLL_TIMEOUT)
+            return True
+        except Full:
+            continue
+    return False
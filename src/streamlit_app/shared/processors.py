@@ -19,6 +19,7 @@ logger = Connections.logger
 
 MOTION_DETECTED = "motion_detected"
 GRID_SHAPE = "grid_shape"
+GRAYSCALE = "grayscale"
 
 
 class LocalStorage(FrameProcessor):
@@ -107,7 +108,20 @@ class LambdaProcessor(FrameProcessor):
         )
 
 
+class GrayscaleConversion(FrameProcessor):
+    """
+    Stateless part of motion detection: stores the grayscale frame in metadata for SimpleMotionDetection,
+    so the conversion can run in parallel workers ahead of the ordered motion detection.
+    """
+
+    def process(self, frame: Frame) -> Frame:
+        frame.metadata[GRAYSCALE] = cv2.cvtColor(frame.buffer, cv2.COLOR_BGR2GRAY)
+        return frame
+
+
 class SimpleMotionDetection(FrameProcessor):
+    stateful = True
+
     def __init__(
         self, thresh_binary=25, motion_threshold: int = 30_000, frame_skip_size: int = 3
     ):
@@ -123,7 +137,9 @@ class SimpleMotionDetection(FrameProcessor):
         return frame
 
     def _detect_motion(self, frame: Frame) -> bool:
-        current_gray = cv2.cvtColor(frame.buffer, cv2.COLOR_BGR2GRAY)
+        current_gray = frame.metadata.pop(GRAYSCALE, None)
+        if current_gray is None:
+            current_gray = cv2.cvtColor(frame.buffer, cv2.COLOR_BGR2GRAY)
         if len(self._prev_grays) >= self._frame_skip_size:
             prev_gray = self._prev_grays.popleft()
             diff = cv2.absdiff(prev_gray, current_gray)
@@ -147,6 +163,8 @@ class MotionSelecting(FrameProcessor):
 
 
 class FrameSampling(FrameProcessor):
+    stateful = True
+
     def __init__(self, sampling: timedelta, threshold_time: timedelta):
         """
         We assume Frame.timestamp is in milliseconds
@@ -186,6 +204,7 @@ class FrameSampling(FrameProcessor):
 
 
 class GridAggregator(FrameProcessor):
+    stateful = True
 
     def __init__(
         self,
@@ -235,6 +254,9 @@ class GridAggregator(FrameProcessor):
         self._last_frame = datetime.now()
 
         # size check
+        if not frame.buffer.flags.owndata:
+            # frame pixels may live in a transport slot that is reused once this call returns
+            frame.buffer = frame.buffer.copy()
         self._frame_buffer.append(frame)
         if len(self._frame_buffer) < self._frame_buffer_size:
             return None
@@ -0,0 +1,151 @@
+# © 2025 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+#
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement
+# available at http://aws.amazon.com/agreement or other written agreement between
+# Customer and either Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+
+from dataclasses import dataclass, replace
+from math import prod
+from multiprocessing import shared_memory
+from queue import Empty
+from typing import Optional
+
+from numpy import ndarray, uint8, may_share_memory
+
+from connections import Connections
+from shared.logic import Frame, FrameTransport
+
+logger = Connections.logger
+
+# One 1080p BGR frame
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+
+@dataclass
+class SharedFrame:
+    """
+    Descriptor sent through the queue instead of the frame.
+    Pixels of `frame` stay in slot `slot` of the shared memory ring, its buffer is None.
+    """
+
+    slot: int
+    shape: tuple
+    dtype: str
+    frame: Frame
+
+
+class SharedMemoryTransport(FrameTransport):
+    """
+    Ring of fixed size frame slots in `multiprocessing.shared_memory`.
+
+    Only `SharedFrame` descriptors cross the queue, consumers map the pixels of the slot without copying.
+    A slot is returned to the ring with `release`, so frames obtained with `unpack` are only valid until then:
+    processors that keep a frame buffer between calls must copy it.
+    Frames larger than `slot_bytes` fall back to being sent through the queue.
+    """
+
+    def __init__(self, ctx, slots: int = 16, slot_bytes: int = DEFAULT_SLOT_BYTES):
+        self._slots = slots
+        self._slot_bytes = slot_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._free_slots = ctx.Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+        self._ring: Optional[ndarray] = None
+        self._oversized_logged = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_ring"] = None
+        return state
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def pack(self, frame: Frame, timeout: Optional[float] = None):
+        """
+        Copies the frame pixels into a free slot.
+        :return: descriptor of the frame, or None if no slot was freed within timeout
+        """
+        buffer = frame.buffer
+        if buffer.nbytes > self._slot_bytes:
+            if not self._oversized_logged:
+                logger.warning(
+                    f"Frame of {buffer.nbytes} bytes exceeds slot size {self._slot_bytes}, sending through the queue"
+                )
+                self._oversized_logged = True
+            return frame
+
+        try:
+            slot = self._free_slots.get(timeout=timeout)
+        except Empty:
+            return None
+
+        self._view(slot, buffer.shape, buffer.dtype)[...] = buffer
+        return SharedFrame(
+            slot, buffer.shape, buffer.dtype.str, replace(frame, buffer=None)
+        )
+
+    def unpack(self, item) -> Frame:
+        if not isinstance(item, SharedFrame):
+            return item
+        return replace(item.frame, buffer=self._view(item.slot, item.shape, item.dtype))
+
+    def repack(self, frame: Frame, item):
+        """
+        Keeps the pixels in the slot of `item` if the frame buffer is still the slot view,
+        otherwise copies them out and releases the slot.
+        """
+        if not isinstance(item, SharedFrame):
+            return frame
+        if frame.buffer is not None:
+            view = self._view(item.slot, item.shape, item.dtype)
+            if (
+                frame.buffer.ctypes.data == view.ctypes.data
+                and frame.buffer.shape == view.shape
+                and frame.buffer.strides == view.strides
+            ):
+                return SharedFrame(
+                    item.slot, item.shape, item.dtype, replace(frame, buffer=None)
+                )
+        frame = self.detach(frame, item)
+        self.release(item)
+        return frame
+
+    def detach(self, frame: Frame, item) -> Frame:
+        """
+        Copies the frame buffer out of the ring if it still points into the slot of `item`,
+        so the frame stays valid after the slot is released.
+        """
+        if (
+            isinstance(item, SharedFrame)
+            and frame.buffer is not None
+            and may_share_memory(frame.buffer, self._ring_view()[item.slot])
+        ):
+            frame.buffer = frame.buffer.copy()
+        return frame
+
+    def release(self, item) -> None:
+        if isinstance(item, SharedFrame):
+            self._free_slots.put(item.slot)
+
+    def close(self) -> None:
+        """Unmaps the ring and frees the shared memory, to be called by the owner once all processes stopped"""
+        self._ring = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _ring_view(self) -> ndarray:
+        if self._ring is None:
+            self._ring = ndarray(
+                (self._slots, self._slot_bytes), dtype=uint8, buffer=self._shm.buf
+            )
+        return self._ring
+
+    def _view(self, slot: int, shape: tuple, dtype) -> ndarray:
+        return self._ring_view()[slot].view(dtype)[: prod(shape)].reshape(shape)
+